@@ -1 +1 @@
-from .enhanced_logger import EnhancedLogger
+from .enhanced_logger import EnhancedLogger, log_context
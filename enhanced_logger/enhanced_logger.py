@@ -1,15 +1,157 @@
 import logging
+import logging.handlers
+import asyncio
+import collections
+import contextvars
 import json
-import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
 import functools
+import http.client
+import urllib.parse
+import reprlib
 import time
+import os
+import queue
+import atexit
+import sys
+import threading
+import warnings
+import tracemalloc
 import psutil
-import requests
 import sqlite3
 
-class JsonFormatter(logging.Formatter):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TRACEMALLOC_ENABLED = os.environ.get('ENH_LOG_TRACEMALLOC') == '1'
+if TRACEMALLOC_ENABLED and sys.version_info < (3, 9):
+    warnings.warn('ENH_LOG_TRACEMALLOC requires Python 3.9+ (tracemalloc.reset_peak); measuring RSS instead')
+    TRACEMALLOC_ENABLED = False
+if TRACEMALLOC_ENABLED and not tracemalloc.is_tracing():
+    tracemalloc.start(1)
+
+class PeakMemoryTracker:
+    # tracemalloc keeps a single process-wide peak. Before a measurement resets it, every measurement
+    # still in progress folds the current peak into its own, so nested calls cannot lose the outer peak.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = []
+
+    def start(self):
+        measurement = [0]
+        with self.lock:
+            self.fold_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.active.append(measurement)
+        return measurement
+
+    def stop(self, measurement):
+        with self.lock:
+            self.fold_peak(tracemalloc.get_traced_memory()[1])
+            self.active.remove(measurement)
+        return measurement[0]
+
+    def fold_peak(self, peak):
+        for measurement in self.active:
+            if peak > measurement[0]:
+                measurement[0] = peak
+
+peak_memory = PeakMemoryTracker()
+
+class LazyRepr:
+    __slots__ = ('value',)
+    max_length = 512
+    repr_limits = reprlib.Repr()
+    repr_limits.maxlevel = 3
+    repr_limits.maxtuple = repr_limits.maxlist = repr_limits.maxdict = repr_limits.maxset = 20
+    repr_limits.maxstring = repr_limits.maxother = 100
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        # reprlib stops descending into large containers, so the cost does not grow with the argument size.
+        text = self.repr_limits.repr(self.value)
+        if len(text) > self.max_length:
+            text = text[:self.max_length - 3] + '...'
+        return text
+
+def json_default(value):
+    if isinstance(value, LazyRepr):
+        return repr(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+# json.dumps() builds a new encoder on every call that passes options, so build it once.
+json_dumps_log_entry = json.JSONEncoder(indent=4, default=json_default).encode
+
+if orjson is not None:
+    def dumps_log_entry(log_entry):
+        try:
+            return orjson.dumps(log_entry, default=json_default,
+                                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson rejects some values json accepts, e.g. integers beyond 64 bits.
+            return json_dumps_log_entry(log_entry)
+else:
+    dumps_log_entry = json_dumps_log_entry
+
+class EnhancedLogRecord(logging.LogRecord):
+    # The cache holds msg and args, so it lives in a slot: SocketHandler pickles record.__dict__ and
+    # QueueHandler.prepare clears args precisely so that records with unpicklable args can be sent.
+    __slots__ = ('_enh_message',)
+
+    def getMessage(self):
+        # Records formatted by several handlers only merge msg and args once.
+        cached = getattr(self, '_enh_message', None)
+        if cached is not None and cached[0] is self.msg and cached[1] is self.args:
+            return cached[2]
+        message = super().getMessage()
+        self._enh_message = (self.msg, self.args, message)
+        return message
+
+    def __getstate__(self):
+        return self.__dict__
+
+log_context = contextvars.ContextVar('enhanced_logger_context', default=None)
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        # A context passed explicitly through extra= takes precedence.
+        if 'context' not in record.__dict__:
+            context = log_context.get()
+            if context is not None:
+                record.context = context
+        return True
+
+class CachedTimeFormatter(logging.Formatter):
+    def time_cache_key(self, datefmt):
+        # The key is stored on the record, which may be pickled, so the converter is referenced by id.
+        return (id(self.converter), datefmt, self.default_time_format, self.default_msec_format)
+
+    def formatTime(self, record, datefmt=None):
+        cache_key = self.time_cache_key(datefmt)
+        cached = record.__dict__.get('_enh_time')
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        formatted_time = super().formatTime(record, datefmt)
+        record._enh_time = (cache_key, formatted_time)
+        return formatted_time
+
+class JsonFormatter(CachedTimeFormatter):
     def format(self, record):
-        log_entry = {
+        # A record shared by several handlers is serialized once per formatter configuration.
+        cache_key = (id(type(self)),) + self.time_cache_key(self.datefmt)
+        cached = record.__dict__.get('_enh_json')
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        formatted_log = dumps_log_entry(self.build_log_entry(record))
+        record._enh_json = (cache_key, formatted_log)
+        return formatted_log
+
+    def build_log_entry(self, record):
+        return {
             'timestamp': self.formatTime(record, self.datefmt),
             'name': record.name,
             'level': record.levelname,
@@ -18,74 +160,327 @@ class JsonFormatter(logging.Formatter):
             'function': record.funcName,
             'line_no': record.lineno,
         }
-        formatted_log = json.dumps(log_entry, indent=4)
-        return formatted_log
 
-class XmlFormatter(logging.Formatter):
+class XmlFormatter(CachedTimeFormatter):
+    template = ('<log_entry><timestamp>%s</timestamp><name>%s</name><level>%s</level>'
+                '<message>%s</message>%s%s<line_no>%d</line_no></log_entry>')
+
     def format(self, record):
-        log_entry = ET.Element('log_entry')
-        timestamp = ET.SubElement(log_entry, 'timestamp')
-        timestamp.text = self.formatTime(record, self.datefmt)
-        name = ET.SubElement(log_entry, 'name')
-        name.text = record.name
-        level = ET.SubElement(log_entry, 'level')
-        level.text = record.levelname
-        message = ET.SubElement(log_entry, 'message')
-        message.text = record.getMessage()
-        context = ET.SubElement(log_entry, 'context')
-        context.text = json.dumps(getattr(record, 'context', None))
-        function = ET.SubElement(log_entry, 'function')
-        function.text = record.funcName
-        line_no = ET.SubElement(log_entry, 'line_no')
-        line_no.text = str(record.lineno)
-        formatted_log = ET.tostring(log_entry, encoding='unicode')
-        return formatted_log
+        return self.template % (
+            self.formatTime(record, self.datefmt),
+            escape(record.name),
+            record.levelname,
+            escape(record.getMessage()),
+            self.encode_context(getattr(record, 'context', None)),
+            self.encode_function(record.funcName),
+            record.lineno,
+        )
+
+    # Only these two fields can be None; they are written as empty elements instead of "null"/"None".
+    @staticmethod
+    def encode_context(context):
+        if context is None:
+            return '<context />'
+        return '<context>%s</context>' % escape(json.dumps(context, default=json_default))
+
+    @staticmethod
+    def encode_function(function):
+        if function is None:
+            return '<function />'
+        return '<function>%s</function>' % escape(function)
 
 class PerformanceLogger(logging.Logger):
     def __init__(self, name, level=logging.NOTSET):
         super().__init__(name, level)
+        self.process = psutil.Process()
+
+    def memory_usage(self):
+        if TRACEMALLOC_ENABLED:
+            return tracemalloc.get_traced_memory()[0]
+        # Re-create the process handle after a fork so the child reports its own RSS.
+        if self.process.pid != os.getpid():
+            self.process = psutil.Process()
+        return self.process.memory_info().rss
 
     def log_performance(self, func):
+        in_flight = threading.local()
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
-            process = psutil.Process()
-            start_memory = process.memory_info().rss
-            result = func(*args, **kwargs)
-            end_time = time.time()
-            end_memory = process.memory_info().rss
-            execution_time = end_time - start_time
-            memory_usage = end_memory - start_memory
-            self.info(f"Execution time: {execution_time} seconds")
-            self.info(f"Memory usage: {memory_usage} bytes")
+            # Without an enabled INFO level and a handler the measurements would be discarded.
+            if not (self.isEnabledFor(logging.INFO) and self.hasHandlers()):
+                return func(*args, **kwargs)
+            # Recursive calls are measured as part of the outermost call only.
+            if getattr(in_flight, 'active', False):
+                return func(*args, **kwargs)
+            if TRACEMALLOC_ENABLED:
+                peak_measurement = peak_memory.start()
+            start_memory = self.memory_usage()
+            start_time = time.perf_counter()
+            in_flight.active = True
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                in_flight.active = False
+                if TRACEMALLOC_ENABLED:
+                    peak_usage = peak_memory.stop(peak_measurement)
+            execution_time = time.perf_counter() - start_time
+            memory_usage = self.memory_usage() - start_memory
+            self.info("Execution time: %s seconds", execution_time)
+            self.info("Memory usage: %s bytes", memory_usage)
+            if TRACEMALLOC_ENABLED:
+                self.info("Peak memory usage: %s bytes", peak_usage - start_memory)
             return result
         return wrapper
 
-class HTTPHandler(logging.Handler):
-    def __init__(self, url, method='POST', headers=None):
+class BatchHandler(logging.Handler):
+    def handle_batch(self, records):
+        records = [record for record in records if self.filter(record)]
+        if records:
+            self.acquire()
+            try:
+                self.emit_batch(records)
+            finally:
+                self.release()
+
+    def emit(self, record):
+        self.emit_batch([record])
+
+    def emit_batch(self, records):
+        raise NotImplementedError('emit_batch must be implemented by BatchHandler subclasses')
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    def __init__(self, log_queue, *handlers, batch_size=100, batch_ms=50):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_ms / 1000.0
+
+    def _monitor(self):
+        while True:
+            record = self.dequeue(True)
+            if record is self._sentinel:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.batch_timeout
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(True, timeout)
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    self.handle_batch(batch)
+                    return
+                batch.append(record)
+            self.handle_batch(batch)
+
+    def handle_batch(self, records):
+        for handler in self.handlers:
+            batch = [record for record in records if record.levelno >= handler.level]
+            if not batch:
+                continue
+            try:
+                if isinstance(handler, BatchHandler):
+                    handler.handle_batch(batch)
+                else:
+                    for record in batch:
+                        handler.handle(record)
+            except Exception:
+                # An error escaping here would end the listener thread and leave the queue growing undrained.
+                handler.handleError(batch[0])
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+class HTTPHandler(BatchHandler):
+    def __init__(self, url, method='POST', headers=None, timeout=10):
         super().__init__()
         self.url = url
         self.method = method
         self.headers = headers or {'Content-Type': 'application/json'}
+        self.timeout = timeout
+        url_parts = urllib.parse.urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if url_parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = url_parts.hostname
+        self.port = url_parts.port
+        self.path = url_parts.path or '/'
+        if url_parts.query:
+            self.path += '?' + url_parts.query
+        self.connection = None
+
+    def send(self, body):
+        if self.connection is None:
+            self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+        self.connection.request(self.method, self.path, body, self.headers)
+        response = self.connection.getresponse()
+        # The body has to be read before the keep-alive connection can be reused.
+        response.read()
+        # Redirects are not followed, so a 3xx means the entries were not delivered.
+        if response.status >= 300:
+            raise http.client.HTTPException(f'{response.status} {response.reason} for url: {self.url}')
+
+    def build_entry(self, record):
+        # JSON entries are embedded as objects rather than as JSON-encoded strings.
+        if isinstance(self.formatter, JsonFormatter):
+            return self.formatter.build_log_entry(record)
+        return self.format(record)
+
+    def close_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def emit_batch(self, records):
+        try:
+            body = json.dumps([self.build_entry(record) for record in records], default=json_default).encode('utf-8')
+            try:
+                self.send(body)
+            except (http.client.BadStatusLine, ConnectionError):
+                # The server may have dropped the idle keep-alive connection; retry once on a fresh one.
+                # Timeouts are not retried: a stalled server would block the listener thread for another full timeout.
+                self.close_connection()
+                self.send(body)
+        except Exception:
+            self.close_connection()
+            self.handleError(records[0])
+
+    def close(self):
+        self.close_connection()
+        super().close()
+
+class AsyncHTTPHandler(logging.Handler):
+    def __init__(self, url, method='POST', headers=None, loop=None, max_pending=1000):
+        super().__init__()
+        try:
+            import aiohttp
+        except ImportError:
+            raise Exception('Module not found!! aiohttp')
+        self.aiohttp = aiohttp
+        self.url = url
+        self.method = method
+        self.headers = headers or {'Content-Type': 'application/json'}
+        # Without an explicit loop, the running loop is picked up on the first emit made inside it.
+        self.explicit_loop = loop
+        self.loop = loop
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.session = None
+
+    def resolve_loop(self):
+        if self.explicit_loop is not None:
+            return self.explicit_loop
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from another thread: use the loop the handler was last used from.
+            loop = self.loop
+        if loop is None or not loop.is_running():
+            raise RuntimeError('AsyncHTTPHandler needs a running event loop, dropping record')
+        if loop is not self.loop:
+            # A new loop (e.g. a second asyncio.run()); the old session and requests belong to the previous one.
+            self.pending.clear()
+            if self.session is not None:
+                # Closed on its own loop while that is still running, otherwise on the new one; aflush() waits for it.
+                closing_loop = self.loop if self.loop.is_running() else loop
+                self.pending.append(asyncio.run_coroutine_threadsafe(self.session.close(), closing_loop))
+                self.session = None
+            self.loop = loop
+        return loop
+
+    async def send(self, record, log_entry):
+        try:
+            if self.session is None:
+                self.session = self.aiohttp.ClientSession()
+            async with self.session.request(self.method, self.url, data=log_entry, headers=self.headers) as response:
+                response.raise_for_status()
+        except Exception:
+            self.handleError(record)
 
     def emit(self, record):
-        log_entry = self.format(record)
         try:
-            response = requests.request(method=self.method, url=self.url, data=log_entry, headers=self.headers)
-            response.raise_for_status()
-        except requests.RequestException as e:
+            loop = self.resolve_loop()
+            log_entry = self.format(record)
+            while self.pending and self.pending[0].done():
+                self.pending.popleft()
+            if len(self.pending) >= self.max_pending:
+                try:
+                    in_loop = asyncio.get_running_loop() is loop
+                except RuntimeError:
+                    in_loop = False
+                if in_loop or not loop.is_running():
+                    # Waiting here would block the loop that has to complete the pending requests,
+                    # or wait forever on a loop that is not running.
+                    raise RuntimeError(f'{len(self.pending)} log requests pending, dropping record')
+                self.pending.popleft().result()
+            self.pending.append(asyncio.run_coroutine_threadsafe(self.send(record, log_entry), loop))
+        except Exception:
             self.handleError(record)
 
-class UniversalDBHandler(logging.Handler):
-    def __init__(self, db_type, connection_params):
+    async def aflush(self):
+        # asyncio.run() cancels whatever is still in flight when the main coroutine returns.
+        while True:
+            pending = [future for future in self.pending if not future.done()]
+            if not pending:
+                break
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in pending), return_exceptions=True)
+
+    async def aclose(self):
+        await self.aflush()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def close(self):
+        if self.session is not None and self.loop is not None and not self.loop.is_closed():
+            if self.loop.is_running():
+                asyncio.run_coroutine_threadsafe(self.session.close(), self.loop)
+            else:
+                self.loop.run_until_complete(self.session.close())
+        super().close()
+
+class UniversalDBHandler(BatchHandler):
+    time_formatter = CachedTimeFormatter()
+    sqlite_insert_sql = "INSERT INTO logs (timestamp, name, level, message) VALUES (?, ?, ?, ?)"
+    postgres_prepare_sql = "PREPARE log_insert AS INSERT INTO logs (timestamp, name, level, message) VALUES ($1, $2, $3, $4)"
+    postgres_insert_sql = "EXECUTE log_insert (%s, %s, %s, %s)"
+    sqlite_create_sql = "CREATE TABLE IF NOT EXISTS logs (timestamp TEXT, name TEXT, level TEXT, message TEXT)"
+    sqlite_index_sql = "CREATE INDEX IF NOT EXISTS logs_timestamp_idx ON logs (timestamp)"
+
+    def __init__(self, db_type, connection_params, index=False):
         super().__init__()
         self.db_type = db_type
         self.connection_params = connection_params
+        self.index = index
         self.conn = self.create_connection()
+        # The cursor is shared by every batch; BatchHandler.handle_batch holds the handler lock while it is used.
+        self.cursor = None
+        if self.db_type == 'sqlite':
+            self.cursor = self.conn.cursor()
+        elif self.db_type == 'postgres':
+            self.cursor = self.conn.cursor()
+            self.cursor.execute(self.postgres_prepare_sql)
+            self.conn.commit()
+        # Resolve the backend once instead of comparing db_type for every batch.
+        self.emit_batch = {
+            'sqlite': self.emit_sqlite,
+            'mongodb': self.emit_mongodb,
+            'postgres': self.emit_postgres,
+        }[self.db_type]
 
     def create_connection(self):
         if self.db_type == 'sqlite':
-            return sqlite3.connect(self.connection_params['db_path'])
+            # Records are written from the queue listener thread.
+            conn = sqlite3.connect(self.connection_params['db_path'], check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-20000')
+            conn.execute(self.sqlite_create_sql)
+            conn.commit()
+            return conn
         elif self.db_type == 'mongodb':
             try:
                 import pymongo             
@@ -94,53 +489,103 @@ class UniversalDBHandler(logging.Handler):
             return pymongo.MongoClient(self.connection_params['uri'])[self.connection_params['db_name']]
         elif self.db_type == 'postgres':
             try:
-                import psycopg2             
+                import psycopg2
+                import psycopg2.extras
             except ImportError:
                 raise Exception(f'Module not found!! {psycopg2}')
+            self.execute_batch = psycopg2.extras.execute_batch
             return psycopg2.connect(**self.connection_params)
         else:
             raise ValueError(f"Unsupported database type: {self.db_type}")
 
-    def emit(self, record):
-        log_entry = {
-            'timestamp': self.formatTime(record, self.datefmt),
-            'name': record.name,
-            'level': record.levelname,
-            'message': record.getMessage(),
-        }
-        if self.db_type == 'sqlite':
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO logs (timestamp, name, level, message) VALUES (?, ?, ?, ?)",
-                           (log_entry['timestamp'], log_entry['name'], log_entry['level'], log_entry['message']))
+    def build_row(self, record):
+        formatter = self.formatter or self.time_formatter
+        return (formatter.formatTime(record, formatter.datefmt), record.name, record.levelname, record.getMessage())
+
+    def rollback(self):
+        # Discard the failed batch so the connection is usable for the next one.
+        try:
+            self.conn.rollback()
+        except Exception:
+            # The connection itself is broken; the caller reports the original error.
+            pass
+
+    def emit_sqlite(self, records):
+        try:
+            self.cursor.executemany(self.sqlite_insert_sql, [self.build_row(record) for record in records])
             self.conn.commit()
-        elif self.db_type == 'mongodb':
-            self.conn['logs'].insert_one(log_entry)
-        elif self.db_type == 'postgres':
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO logs (timestamp, name, level, message) VALUES (%s, %s, %s, %s)",
-                           (log_entry['timestamp'], log_entry['name'], log_entry['level'], log_entry['message']))
+        except Exception:
+            self.rollback()
+            self.handleError(records[0])
+
+    def emit_postgres(self, records):
+        try:
+            self.execute_batch(self.cursor, self.postgres_insert_sql, [self.build_row(record) for record in records])
             self.conn.commit()
+        except Exception:
+            self.rollback()
+            self.handleError(records[0])
+
+    def emit_mongodb(self, records):
+        try:
+            self.conn['logs'].insert_many([
+                {'timestamp': timestamp, 'name': name, 'level': level, 'message': message}
+                for timestamp, name, level, message in map(self.build_row, records)
+            ])
+        except Exception:
+            self.handleError(records[0])
 
     def close(self):
-        if self.db_type == 'sqlite' or self.db_type == 'postgres':
-            self.conn.close()
+        # logging.shutdown() may close the handler again after the application did.
+        if self.conn is not None:
+            if self.db_type == 'sqlite' and self.index:
+                # Built once here so inserts do not have to maintain the index while logging.
+                self.conn.execute(self.sqlite_index_sql)
+                self.conn.commit()
+            if self.db_type == 'sqlite' or self.db_type == 'postgres':
+                self.conn.close()
+            self.conn = None
         super().close()
 
 class EnhancedLogger:
+    fast_json_files = {}
+
+    @staticmethod
+    def install_record_factory():
+        # Leave a record factory installed by the application alone.
+        if logging.getLogRecordFactory() is logging.LogRecord:
+            logging.setLogRecordFactory(EnhancedLogRecord)
+
+    @staticmethod
+    def has_handler(logger, tag):
+        # Configuring the same logger again must not add a second copy of a handler.
+        return any(getattr(handler, '_enh_tag', None) == tag for handler in logger.handlers)
+
+    @staticmethod
+    def add_handler(logger, handler, tag):
+        handler._enh_tag = tag
+        logger.addHandler(handler)
+
     @staticmethod
     def configure_logger(name, formatter, log_to_file=None):
+        EnhancedLogger.install_record_factory()
         logger = logging.getLogger(name)
         logger.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        stream_tag = ('stream', type(formatter))
+        if not EnhancedLogger.has_handler(logger, stream_tag):
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            ch.setFormatter(formatter)
+            EnhancedLogger.add_handler(logger, ch, stream_tag)
 
-        if log_to_file:
-            fh = logging.FileHandler(log_to_file)
+        file_tag = ('file', log_to_file and os.path.abspath(log_to_file), type(formatter))
+        if log_to_file and not EnhancedLogger.has_handler(logger, file_tag):
+            # orjson writes non-ASCII characters unescaped, which the locale encoding may not be able to represent.
+            encoding = 'utf-8' if isinstance(formatter, JsonFormatter) else None
+            fh = logging.FileHandler(log_to_file, encoding=encoding)
             fh.setLevel(logging.DEBUG)
             fh.setFormatter(formatter)
-            logger.addHandler(fh)
+            EnhancedLogger.add_handler(logger, fh, file_tag)
 
         return logger
 
@@ -148,25 +593,33 @@ class EnhancedLogger:
     def json_log(logger_name, log_to_file=None):
         formatter = JsonFormatter()
         logger = EnhancedLogger.configure_logger(logger_name, formatter, log_to_file)
+        if not any(isinstance(log_filter, ContextFilter) for log_filter in logger.filters):
+            logger.addFilter(ContextFilter())
 
         def decorator(func):
+            # Bound once per decorated function; the wrapper only re-checks the level per call.
+            is_enabled = logger.isEnabledFor
+            log = logger._log
+            func_name = func.__name__
+
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                context_info = {
-                    'context': {
-                        'args': args,
-                        'kwargs': kwargs
-                    }
-                }
-                logger.info(f"Entering function {func.__name__}", extra=context_info)
-                result = func(*args, **kwargs)
-                logger.info(f"Exiting function {func.__name__} with result {result}", extra=context_info)
+                if not is_enabled(logging.INFO):
+                    return func(*args, **kwargs)
+                token = log_context.set({'args': LazyRepr(args), 'kwargs': LazyRepr(kwargs)})
+                try:
+                    log(logging.INFO, "Entering function %s", (func_name,))
+                    result = func(*args, **kwargs)
+                    log(logging.INFO, "Exiting function %s with result %s", (func_name, result))
+                finally:
+                    log_context.reset(token)
                 return result
             return wrapper
         return decorator
 
     @staticmethod
     def configure_performance_logger(name, log_to_file=None):
+        EnhancedLogger.install_record_factory()
         logger = PerformanceLogger(name)
         if log_to_file:
             fh = logging.FileHandler(log_to_file)
@@ -175,23 +628,120 @@ class EnhancedLogger:
         return logger
 
     @staticmethod
-    def configure_http_logger(name, url, method='POST', headers=None, log_to_file=None):
+    def configure_fast_json_logger(name, level=logging.INFO, log_to_file=None):
+        # Not a logging.Logger: records never reach stdlib handlers, filters or parent loggers.
+        try:
+            import structlog
+        except ImportError:
+            raise Exception('Module not found!! structlog')
+        processors = [
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt='iso', utc=True),
+        ]
+        log_file = EnhancedLogger.open_fast_json_file(log_to_file) if log_to_file else None
+        if orjson is not None:
+            processors.append(structlog.processors.JSONRenderer(serializer=orjson.dumps))
+            output = structlog.BytesLogger(log_file)
+        else:
+            processors.append(structlog.processors.JSONRenderer())
+            output = structlog.WriteLogger(log_file)
+        return structlog.wrap_logger(
+            output,
+            processors=processors,
+            wrapper_class=structlog.make_filtering_bound_logger(level),
+            cache_logger_on_first_use=True,
+            name=name,
+        )
+
+    @staticmethod
+    def open_fast_json_file(log_to_file):
+        # One handle per path, shared by every fast JSON logger writing there and closed at exit.
+        path = os.path.abspath(log_to_file)
+        log_file = EnhancedLogger.fast_json_files.get(path)
+        if log_file is None:
+            log_file = open(path, 'ab' if orjson is not None else 'a')
+            atexit.register(log_file.close)
+            EnhancedLogger.fast_json_files[path] = log_file
+        return log_file
+
+    @staticmethod
+    def configure_http_logger(name, url, method='POST', headers=None, log_to_file=None, batch_size=None, batch_ms=None,
+                              buffer_size=None, timeout=10):
+        EnhancedLogger.install_record_factory()
         logger = logging.getLogger(name)
         logger.setLevel(logging.DEBUG)
-        http_handler = HTTPHandler(url, method, headers)
-        logger.addHandler(http_handler)
+        http_tag = ('http', url, method)
+        if not EnhancedLogger.has_handler(logger, http_tag):
+            http_handler = HTTPHandler(url, method, headers, timeout)
+            handler = EnhancedLogger.configure_queue_handler(http_handler, batch_size, batch_ms)
+            if buffer_size:
+                handler = EnhancedLogger.configure_memory_handler(handler, buffer_size)
+            EnhancedLogger.add_handler(logger, handler, http_tag)
 
-        if log_to_file:
+        file_tag = ('file', log_to_file and os.path.abspath(log_to_file))
+        if log_to_file and not EnhancedLogger.has_handler(logger, file_tag):
             fh = logging.FileHandler(log_to_file)
             fh.setLevel(logging.DEBUG)
-            logger.addHandler(fh)
+            EnhancedLogger.add_handler(logger, fh, file_tag)
 
         return logger
 
     @staticmethod
-    def configure_db_logger(name, db_type, connection_params):
+    def configure_async_http_logger(name, url, method='POST', headers=None, log_to_file=None, loop=None, max_pending=1000):
+        EnhancedLogger.install_record_factory()
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.DEBUG)
+        http_tag = ('async_http', url, method)
+        if not EnhancedLogger.has_handler(logger, http_tag):
+            http_handler = AsyncHTTPHandler(url, method, headers, loop, max_pending)
+            EnhancedLogger.add_handler(logger, http_handler, http_tag)
+
+        file_tag = ('file', log_to_file and os.path.abspath(log_to_file))
+        if log_to_file and not EnhancedLogger.has_handler(logger, file_tag):
+            fh = logging.FileHandler(log_to_file)
+            fh.setLevel(logging.DEBUG)
+            EnhancedLogger.add_handler(logger, fh, file_tag)
+
+        return logger
+
+    @staticmethod
+    async def aclose_async_http_logger(logger):
+        # Awaited before the event loop ends, so the entries still being sent are delivered.
+        for handler in logger.handlers:
+            if isinstance(handler, AsyncHTTPHandler):
+                await handler.aclose()
+
+    @staticmethod
+    def configure_queue_handler(handler, batch_size=None, batch_ms=None):
+        batch_size = batch_size or int(os.environ.get('ENH_LOG_BATCH_SIZE', 100))
+        batch_ms = batch_ms or int(os.environ.get('ENH_LOG_BATCH_MS', 50))
+        log_queue = queue.SimpleQueue()
+        listener = BatchQueueListener(log_queue, handler, batch_size=batch_size, batch_ms=batch_ms)
+        listener.start()
+        atexit.register(listener.stop)
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.listener = listener
+        return queue_handler
+
+    @staticmethod
+    def configure_memory_handler(target, buffer_size):
+        memory_handler = logging.handlers.MemoryHandler(buffer_size, flushLevel=logging.ERROR, target=target,
+                                                        flushOnClose=True)
+        # Registered after the queue listener's stop, so it runs first at exit and the listener still drains it.
+        atexit.register(memory_handler.flush)
+        return memory_handler
+
+    @staticmethod
+    def configure_db_logger(name, db_type, connection_params, batch_size=None, batch_ms=None, index=False,
+                            buffer_size=None):
+        EnhancedLogger.install_record_factory()
         logger = logging.getLogger(name)
         logger.setLevel(logging.DEBUG)
-        db_handler = UniversalDBHandler(db_type, connection_params)
-        logger.addHandler(db_handler)
+        db_tag = ('db', db_type, connection_params)
+        if not EnhancedLogger.has_handler(logger, db_tag):
+            db_handler = UniversalDBHandler(db_type, connection_params, index)
+            handler = EnhancedLogger.configure_queue_handler(db_handler, batch_size, batch_ms)
+            if buffer_size:
+                handler = EnhancedLogger.configure_memory_handler(handler, buffer_size)
+            EnhancedLogger.add_handler(logger, handler, db_tag)
         return logger
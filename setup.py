@@ -11,17 +11,20 @@ setup(
     url='https://github.com/Rohan7654/enhanced_logger_package.git',
     packages=find_packages(),
     install_requires=[
-        'requests',
         'psutil',
         'pymongo',
         'psycopg2-binary',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+        'structlog': ['structlog', 'orjson'],
+        'aiohttp': ['aiohttp'],
+    },
     license='MIT',
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
@@ -30,6 +33,6 @@ setup(
         'Programming Language :: Python :: 3.12',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     include_package_data=True,
 )
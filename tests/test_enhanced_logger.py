@@ -19,6 +19,16 @@ def compute_factorial(n):
     else:
         return n * compute_factorial(n - 1)
 
+# Test Fast JSON Logger (requires the optional structlog extra)
+try:
+    import structlog
+except ImportError:
+    structlog = None
+
+if structlog is not None:
+    fast_json_logger = EnhancedLogger.configure_fast_json_logger('fast_json_logger', log_to_file='fast_json_logs.log')
+    fast_json_logger.info('This is a test log entry in JSON format.', user_id=12345)
+
 # Test HTTP Logger (Assuming a logging endpoint is available)
 http_logger = EnhancedLogger.configure_http_logger('http_logger', 'http://example.com/log', method='POST', headers={'Content-Type': 'application/json'}, log_to_file='http_logs.log')
 http_logger.info('This is a test log entry sent via HTTP.')
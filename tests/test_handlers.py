@@ -0,0 +1,562 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import pickle
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import enhanced_logger.enhanced_logger as enhanced_logger_module
+from enhanced_logger import EnhancedLogger, log_context
+from enhanced_logger.enhanced_logger import (BatchHandler, BatchQueueListener, HTTPHandler, JsonFormatter,
+                                             UniversalDBHandler, XmlFormatter)
+
+
+class RecordingHandler(BatchHandler):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def emit_batch(self, records):
+        self.batches.append([record.getMessage() for record in records])
+
+
+def make_record(message, level=logging.INFO):
+    return logging.LogRecord('test', level, __file__, 1, message, None, None)
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_listener_groups_records_into_batches():
+    log_queue = queue.SimpleQueue()
+    handler = RecordingHandler()
+    for i in range(25):
+        log_queue.put(make_record(f'message {i}'))
+    listener = BatchQueueListener(log_queue, handler, batch_size=10, batch_ms=1000)
+    listener.start()
+    listener.stop()
+    assert [len(batch) for batch in handler.batches] == [10, 10, 5]
+    assert handler.batches[0][0] == 'message 0'
+    assert handler.batches[-1][-1] == 'message 24'
+
+
+def test_listener_respects_handler_level():
+    log_queue = queue.SimpleQueue()
+    handler = RecordingHandler()
+    handler.setLevel(logging.WARNING)
+    log_queue.put(make_record('info'))
+    log_queue.put(make_record('warning', logging.WARNING))
+    listener = BatchQueueListener(log_queue, handler, batch_size=10, batch_ms=1000)
+    listener.start()
+    listener.stop()
+    assert handler.batches == [['warning']]
+
+
+def test_sqlite_logs_table_is_created(tmp_path):
+    db_path = str(tmp_path / 'logs.db')
+    handler = UniversalDBHandler('sqlite', {'db_path': db_path})
+    handler.close()
+    assert count_rows(db_path) == 0
+
+
+def test_sqlite_records_are_flushed_on_listener_stop(tmp_path):
+    db_path = str(tmp_path / 'logs.db')
+    logger = EnhancedLogger.configure_db_logger('test_sqlite_flush', 'sqlite', {'db_path': db_path},
+                                                batch_size=1000, batch_ms=60000)
+    for i in range(250):
+        logger.info('message %d', i)
+    logger.handlers[0].listener.stop()
+    assert count_rows(db_path) == 250
+
+
+def test_sqlite_failed_batch_is_rolled_back(tmp_path):
+    db_path = str(tmp_path / 'logs.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (timestamp TEXT, name TEXT, level TEXT, message TEXT CHECK (message != 'bad'))")
+    conn.commit()
+    conn.close()
+    handler = UniversalDBHandler('sqlite', {'db_path': db_path})
+    raise_exceptions = logging.raiseExceptions
+    logging.raiseExceptions = False
+    try:
+        handler.handle_batch([make_record('good'), make_record('bad')])
+    finally:
+        logging.raiseExceptions = raise_exceptions
+    handler.handle_batch([make_record('after')])
+    handler.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT message FROM logs').fetchall() == [('after',)]
+    conn.close()
+
+
+def test_sqlite_batch_on_broken_connection_is_reported(tmp_path):
+    handler = UniversalDBHandler('sqlite', {'db_path': str(tmp_path / 'logs.db')})
+    failed = []
+    handler.handleError = failed.append
+    handler.conn.close()
+    handler.handle_batch([make_record('lost')])
+    assert [record.getMessage() for record in failed] == ['lost']
+
+
+def test_listener_survives_a_failing_handler():
+    class FailingHandler(BatchHandler):
+        def handle_batch(self, records):
+            raise RuntimeError('broken')
+
+    failing = FailingHandler()
+    failed = []
+    failing.handleError = failed.append
+    recording = RecordingHandler()
+    log_queue = queue.SimpleQueue()
+    for i in range(3):
+        log_queue.put(make_record(f'message {i}'))
+    listener = BatchQueueListener(log_queue, failing, recording, batch_size=1, batch_ms=1000)
+    listener.start()
+    listener.stop()
+    assert recording.batches == [['message 0'], ['message 1'], ['message 2']]
+    assert len(failed) == 3
+
+
+def start_http_server(status=200):
+    received = []
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_PUT(self):
+            length = int(self.headers['Content-Length'])
+            received.append(self.rfile.read(length).decode('utf-8'))
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+def test_http_batch_embeds_json_entries_as_objects():
+    server, received = start_http_server()
+    try:
+        handler = HTTPHandler(f'http://127.0.0.1:{server.server_port}/log')
+        handler.setFormatter(JsonFormatter())
+        handler.handle_batch([make_record('first'), make_record('second')])
+        handler.close()
+    finally:
+        server.shutdown()
+    assert [entry['message'] for entry in received[0]] == ['first', 'second']
+
+
+def test_http_batch_sends_formatted_strings_without_json_formatter():
+    server, received = start_http_server()
+    try:
+        handler = HTTPHandler(f'http://127.0.0.1:{server.server_port}/log')
+        handler.handle_batch([make_record('first'), make_record('second')])
+        handler.close()
+    finally:
+        server.shutdown()
+    assert received == [['first', 'second']]
+
+
+def test_http_redirect_is_reported_as_a_failed_send():
+    server, received = start_http_server(status=302)
+    failed = []
+    try:
+        handler = HTTPHandler(f'http://127.0.0.1:{server.server_port}/log')
+        handler.handleError = failed.append
+        handler.handle_batch([make_record('first')])
+        handler.close()
+    finally:
+        server.shutdown()
+    assert len(received) == 1
+    assert [record.getMessage() for record in failed] == ['first']
+
+
+def test_http_stalled_server_times_out():
+    # Accepts connections but never answers.
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    failed = []
+    try:
+        handler = HTTPHandler(f'http://127.0.0.1:{server.getsockname()[1]}/log', timeout=0.2)
+        handler.handleError = failed.append
+        handler.handle_batch([make_record('first')])
+        assert handler.connection is None
+        handler.close()
+    finally:
+        server.close()
+    assert [record.getMessage() for record in failed] == ['first']
+
+
+def test_async_http_uses_the_running_loop_by_default():
+    pytest.importorskip('aiohttp')
+    server, received = start_http_server()
+    url = f'http://127.0.0.1:{server.server_port}/log'
+    logger = EnhancedLogger.configure_async_http_logger('test_async_default_loop', url, method='PUT')
+    handler = logger.handlers[0]
+    raise_exceptions = logging.raiseExceptions
+    logging.raiseExceptions = False
+    try:
+        # No loop is running yet: the record is dropped instead of blocking on a future that never completes.
+        logger.info('before')
+
+        async def main():
+            logger.info('first')
+            logger.info('second')
+            await EnhancedLogger.aclose_async_http_logger(logger)
+
+        asyncio.run(main())
+    finally:
+        logging.raiseExceptions = raise_exceptions
+        logger.removeHandler(handler)
+        server.shutdown()
+    assert sorted(received) == ['first', 'second']
+
+
+def test_async_http_delivers_pending_entries_on_aclose():
+    pytest.importorskip('aiohttp')
+    server, received = start_http_server()
+    url = f'http://127.0.0.1:{server.server_port}/log'
+
+    async def main():
+        logger = EnhancedLogger.configure_async_http_logger('test_async_aclose', url, method='PUT')
+        try:
+            for i in range(5):
+                logger.info('message %d', i)
+        finally:
+            await EnhancedLogger.aclose_async_http_logger(logger)
+        return logger
+
+    try:
+        logger = asyncio.run(main())
+    finally:
+        server.shutdown()
+    logger.removeHandler(logger.handlers[0])
+    assert sorted(received) == [f'message {i}' for i in range(5)]
+
+
+def test_async_http_closes_the_session_of_a_previous_loop():
+    pytest.importorskip('aiohttp')
+    server, received = start_http_server()
+    url = f'http://127.0.0.1:{server.server_port}/log'
+    logger = EnhancedLogger.configure_async_http_logger('test_async_new_loop', url, method='PUT')
+    handler = logger.handlers[0]
+
+    async def first():
+        logger.info('first')
+        await handler.aflush()
+        return handler.session
+
+    async def second():
+        logger.info('second')
+        await EnhancedLogger.aclose_async_http_logger(logger)
+
+    try:
+        old_session = asyncio.run(first())
+        asyncio.run(second())
+    finally:
+        logger.removeHandler(handler)
+        server.shutdown()
+    assert old_session.closed
+    assert sorted(received) == ['first', 'second']
+
+
+def test_nested_measurement_keeps_outer_peak(monkeypatch):
+    if not hasattr(tracemalloc, 'reset_peak'):
+        pytest.skip('tracemalloc.reset_peak requires Python 3.9+')
+    monkeypatch.setattr(enhanced_logger_module, 'TRACEMALLOC_ENABLED', True)
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start(1)
+    try:
+        performance_logger = EnhancedLogger.configure_performance_logger('test_nested_peak')
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        performance_logger.addHandler(handler)
+
+        @performance_logger.log_performance
+        def inner():
+            return len(bytearray(1000))
+
+        @performance_logger.log_performance
+        def outer():
+            data = bytearray(5 * 1024 * 1024)
+            del data
+            return inner()
+
+        outer()
+    finally:
+        if not started:
+            tracemalloc.stop()
+    peaks = [int(message.split()[3]) for message in messages if message.startswith('Peak memory usage')]
+    # inner() is logged first; the outer peak must still include the 5 MiB allocation made before it ran.
+    assert peaks[0] < 1024 * 1024
+    assert peaks[1] >= 5 * 1024 * 1024
+
+
+@pytest.mark.parametrize('context', [{1: 'a'}, {'n': 2 ** 70}])
+def test_json_formatter_accepts_contexts_the_json_module_accepts(context):
+    record = make_record('message')
+    record.context = context
+    assert json.loads(JsonFormatter().format(record))['context'] == json.loads(json.dumps(context))
+
+
+def test_fast_json_loggers_share_one_file_handle(tmp_path):
+    pytest.importorskip('structlog')
+    log_path = str(tmp_path / 'fast.log')
+    first = EnhancedLogger.configure_fast_json_logger('fast_first', log_to_file=log_path)
+    second = EnhancedLogger.configure_fast_json_logger('fast_second', log_to_file=log_path)
+    first.info('one')
+    second.info('two')
+    log_file = EnhancedLogger.fast_json_files[log_path]
+    log_file.flush()
+    with open(log_path) as f:
+        assert [json.loads(line)['event'] for line in f] == ['one', 'two']
+    assert EnhancedLogger.open_fast_json_file(log_path) is log_file
+
+
+def test_cached_timestamp_depends_on_default_time_format():
+    class CompactJsonFormatter(JsonFormatter):
+        default_time_format = '%Y%m%d%H%M%S'
+        default_msec_format = '%s%03d'
+
+    record = make_record('message')
+    standard = json.loads(JsonFormatter().format(record))['timestamp']
+    compact = json.loads(CompactJsonFormatter().format(record))['timestamp']
+    assert compact.isdigit()
+    assert standard != compact
+
+
+def test_configured_logger_propagates_to_root(caplog):
+    logger = EnhancedLogger.configure_logger('test_propagation', JsonFormatter())
+    with caplog.at_level(logging.INFO):
+        logger.info('reaches the root logger')
+    assert [record.getMessage() for record in caplog.records] == ['reaches the root logger']
+
+
+class Unpicklable:
+    def __reduce__(self):
+        raise TypeError('not picklable')
+
+    def __str__(self):
+        return 'unpicklable'
+
+
+def test_prepared_record_with_unpicklable_args_can_be_pickled():
+    record = enhanced_logger_module.EnhancedLogRecord('test', logging.INFO, __file__, 1, 'value %s', (Unpicklable(),), None)
+    assert record.getMessage() == 'value unpicklable'
+    prepared = logging.handlers.QueueHandler(queue.SimpleQueue()).prepare(record)
+    assert pickle.loads(pickle.dumps(prepared)).getMessage() == 'value unpicklable'
+    socket_pickle = logging.handlers.SocketHandler('127.0.0.1', None).makePickle(record)
+    assert pickle.loads(socket_pickle[4:])['msg'] == 'value unpicklable'
+
+
+def test_json_entries_are_cached_per_converter():
+    utc_formatter = JsonFormatter()
+    utc_formatter.converter = lambda seconds: time.gmtime(0)
+    record = make_record('message')
+    local = json.loads(JsonFormatter().format(record))['timestamp']
+    utc = json.loads(utc_formatter.format(record))['timestamp']
+    assert utc.startswith('1970-01-01 00:00:00')
+    assert local != utc
+
+
+def test_json_fallback_matches_json_dumps(monkeypatch):
+    monkeypatch.setattr(enhanced_logger_module, 'dumps_log_entry', enhanced_logger_module.json_dumps_log_entry)
+    record = make_record('caf\u00e9')
+    formatter = JsonFormatter()
+    assert formatter.format(record) == json.dumps(formatter.build_log_entry(record), indent=4)
+
+
+def test_json_log_file_is_written_as_utf8(tmp_path, monkeypatch):
+    encodings = []
+
+    class RecordingFileHandler(logging.FileHandler):
+        def __init__(self, filename, encoding=None):
+            # Independent of the locale encoding of the machine running the test.
+            encodings.append(encoding)
+            super().__init__(filename, encoding=encoding)
+
+    monkeypatch.setattr(logging, 'FileHandler', RecordingFileHandler)
+    logger = EnhancedLogger.configure_logger('test_json_utf8', JsonFormatter(), str(tmp_path / 'json.log'))
+    for handler in logger.handlers:
+        if isinstance(handler, RecordingFileHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    assert encodings == ['utf-8']
+
+
+def remove_handlers(logger):
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        if hasattr(handler, 'listener'):
+            handler.listener.stop()
+            handler.listener.handlers[0].close()
+        handler.close()
+
+
+def test_configure_logger_twice_adds_handlers_once(tmp_path):
+    log_path = str(tmp_path / 'json.log')
+    EnhancedLogger.configure_logger('test_dedupe', JsonFormatter(), log_path)
+    logger = EnhancedLogger.configure_logger('test_dedupe', JsonFormatter(), log_path)
+    try:
+        assert len(logger.handlers) == 2
+    finally:
+        remove_handlers(logger)
+
+
+def test_json_log_twice_adds_handlers_and_filter_once():
+    EnhancedLogger.json_log('test_dedupe_json_log')
+    EnhancedLogger.json_log('test_dedupe_json_log')
+    logger = logging.getLogger('test_dedupe_json_log')
+    try:
+        assert len(logger.handlers) == 1
+        assert len(logger.filters) == 1
+    finally:
+        remove_handlers(logger)
+
+
+def test_configure_logger_adds_handlers_for_another_file_or_formatter(tmp_path):
+    EnhancedLogger.configure_logger('test_dedupe_distinct', JsonFormatter(), str(tmp_path / 'first.log'))
+    EnhancedLogger.configure_logger('test_dedupe_distinct', JsonFormatter(), str(tmp_path / 'second.log'))
+    logger = EnhancedLogger.configure_logger('test_dedupe_distinct', XmlFormatter(), str(tmp_path / 'first.log'))
+    try:
+        # One stream handler per formatter class, one file handler per path and formatter class.
+        assert len(logger.handlers) == 5
+    finally:
+        remove_handlers(logger)
+
+
+def test_configure_db_logger_twice_starts_one_listener(tmp_path, monkeypatch):
+    started = []
+    original_start = BatchQueueListener.start
+
+    def start(listener):
+        started.append(listener)
+        original_start(listener)
+
+    monkeypatch.setattr(BatchQueueListener, 'start', start)
+    connection_params = {'db_path': str(tmp_path / 'logs.db')}
+    EnhancedLogger.configure_db_logger('test_dedupe_db', 'sqlite', connection_params)
+    logger = EnhancedLogger.configure_db_logger('test_dedupe_db', 'sqlite', connection_params)
+    try:
+        assert len(logger.handlers) == 1
+        assert started == [logger.handlers[0].listener]
+    finally:
+        remove_handlers(logger)
+
+
+def recording_performance_logger(name):
+    performance_logger = EnhancedLogger.configure_performance_logger(name)
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    performance_logger.addHandler(handler)
+    return performance_logger, messages
+
+
+def test_recursive_function_is_measured_once():
+    performance_logger, messages = recording_performance_logger('test_recursion')
+
+    @performance_logger.log_performance
+    def factorial(n):
+        return 1 if n == 0 else n * factorial(n - 1)
+
+    assert factorial(10) == 3628800
+    assert len([message for message in messages if message.startswith('Execution time')]) == 1
+
+
+def test_recursion_flag_is_reset_when_the_function_raises():
+    performance_logger, messages = recording_performance_logger('test_recursion_raises')
+
+    @performance_logger.log_performance
+    def countdown(n, fail):
+        if n == 0:
+            if fail:
+                raise ValueError('failed')
+            return 0
+        return countdown(n - 1, fail)
+
+    with pytest.raises(ValueError):
+        countdown(3, True)
+    assert messages == []
+    # A flag left set by the failed call would skip the measurement of this one.
+    countdown(3, False)
+    assert len([message for message in messages if message.startswith('Execution time')]) == 1
+
+
+def recording_json_log(name):
+    decorator = EnhancedLogger.json_log(name)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logging.getLogger(name).addHandler(handler)
+    return decorator, records
+
+
+@pytest.mark.parametrize('argument', ['x' * 1000000, [list(range(1000))] * 1000, {i: 'y' * 1000 for i in range(1000)}])
+def test_huge_arguments_are_rendered_in_bounded_size(argument):
+    log_json, records = recording_json_log('test_lazy_repr')
+
+    @log_json
+    def identity(value):
+        return None
+
+    identity(argument)
+    context = json.loads(JsonFormatter().format(records[0]))['context']
+    assert len(context['args']) <= enhanced_logger_module.LazyRepr.max_length
+
+
+def test_explicit_context_wins_over_the_context_variable():
+    log_json, records = recording_json_log('test_explicit_context')
+    logger = logging.getLogger('test_explicit_context')
+
+    @log_json
+    def work(value):
+        logger.info('implicit')
+        logger.info('explicit', extra={'context': {'request_id': 7}})
+
+    work(1)
+    contexts = {record.getMessage(): record.context for record in records}
+    assert repr(contexts['implicit']['args']) == '(1,)'
+    assert contexts['explicit'] == {'request_id': 7}
+
+
+def test_context_variable_is_reset_after_the_call():
+    log_json, records = recording_json_log('test_context_reset')
+
+    @log_json
+    def work(fail):
+        if fail:
+            raise ValueError('failed')
+
+    work(False)
+    assert log_context.get() is None
+    with pytest.raises(ValueError):
+        work(True)
+    assert log_context.get() is None